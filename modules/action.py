@@ -1,11 +1,13 @@
 # modules/action.py
 
-from typing import Dict, Any, Union
+from typing import Dict, Any, KeysView, List, Optional, Tuple, Union
 from pydantic import BaseModel
 import asyncio
 import types
 import json
-from modules.heuristics import get_validator, HeuristicViolation
+import re
+from functools import lru_cache
+from modules.heuristics import get_validator, json_dumps, HeuristicViolation
 
 
 # Optional logging fallback
@@ -25,6 +27,74 @@ class ToolCallResult(BaseModel):
 
 MAX_TOOL_CALLS_PER_PLAN = 5
 
+@lru_cache(maxsize=128)
+def _compile_plan(code: str) -> types.CodeType:
+    """Compile a solve() plan once per distinct plan text (retries often resend the same plan)"""
+    return compile(code, "<solve_plan>", "exec")
+
+class SandboxMCP:
+    """MCP client exposed to solve() plans as `mcp`; validates every tool call before dispatching"""
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.call_count = 0
+        # Tool registry is static for the plan's lifetime; dict keys give O(1) lookup
+        # while keeping registry order for the "Available tools" hint
+        self._tools_cache: Optional[KeysView[str]] = None
+        # Validation results for repeated (tool_name, canonical args) calls
+        self._validation_cache: Dict[Tuple[str, str], Tuple[bool, List[str]]] = {}
+
+    async def call_tool(self, tool_name: str, input_dict: dict):
+        self.call_count += 1
+        if self.call_count > MAX_TOOL_CALLS_PER_PLAN:
+            raise RuntimeError(f"Exceeded max tool calls ({MAX_TOOL_CALLS_PER_PLAN}) in solve() plan.")
+
+        # === HEURISTIC VALIDATION: Tool Call Validation ===
+        validator = get_validator()
+        if self._tools_cache is None:
+            self._tools_cache = dict.fromkeys(await self.dispatcher.list_all_tools()).keys()
+
+        # Serialize once (canonical key order) for both validation and the cache key;
+        # unserializable args are reported by the validator
+        try:
+            args_str = json_dumps(input_dict, sort_keys=True)
+        except Exception:
+            args_str = None  # e.g. TypeError, ValueError, RecursionError
+
+        # URL checks consume rate-limit budget, so those calls are always re-validated
+        inner = input_dict.get("input") if isinstance(input_dict, dict) else None
+        cacheable = args_str is not None and not (isinstance(inner, dict) and "url" in inner)
+        cache_key = (tool_name, args_str)
+
+        if cacheable and cache_key in self._validation_cache:
+            is_valid, errors = self._validation_cache[cache_key]
+        else:
+            is_valid, errors = await validator.validate_tool_call(
+                tool_name=tool_name,
+                tool_args=input_dict,
+                available_tools=self._tools_cache,
+                args_str=args_str
+            )
+            if cacheable:
+                self._validation_cache[cache_key] = (is_valid, errors)
+
+        if not is_valid:
+            error_summary = "; ".join(errors)
+            log("heuristic", f"🚫 Tool call validation failed: {error_summary}")
+            raise RuntimeError(f"Tool call validation failed: {error_summary}")
+
+        # REAL tool call now (with timeout)
+        try:
+            timeout = validator.get_timeout_config()
+            result = await validator.execute_with_timeout(
+                self.dispatcher.call_tool(tool_name, input_dict),
+                timeout=timeout
+            )
+            return result
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Tool call to '{tool_name}' timed out after {timeout}s")
+        except HeuristicViolation as e:
+            raise RuntimeError(str(e))
+
 async def run_python_sandbox(code: str, dispatcher: Any) -> str:
     print("[action] 🔍 Entered run_python_sandbox()")
     
@@ -40,53 +110,16 @@ async def run_python_sandbox(code: str, dispatcher: Any) -> str:
 
     try:
         # Patch MCP client with real dispatcher
-        class SandboxMCP:
-            def __init__(self, dispatcher):
-                self.dispatcher = dispatcher
-                self.call_count = 0
-
-            async def call_tool(self, tool_name: str, input_dict: dict):
-                self.call_count += 1
-                if self.call_count > MAX_TOOL_CALLS_PER_PLAN:
-                    raise RuntimeError(f"Exceeded max tool calls ({MAX_TOOL_CALLS_PER_PLAN}) in solve() plan.")
-                
-                # === HEURISTIC VALIDATION: Tool Call Validation ===
-                validator = get_validator()
-                available_tools = await self.dispatcher.list_all_tools()
-                
-                is_valid, errors = await validator.validate_tool_call(
-                    tool_name=tool_name,
-                    tool_args=input_dict,
-                    available_tools=available_tools
-                )
-                
-                if not is_valid:
-                    error_summary = "; ".join(errors)
-                    log("heuristic", f"🚫 Tool call validation failed: {error_summary}")
-                    raise RuntimeError(f"Tool call validation failed: {error_summary}")
-                
-                # REAL tool call now (with timeout)
-                try:
-                    timeout = validator.get_timeout_config()
-                    result = await validator.execute_with_timeout(
-                        self.dispatcher.call_tool(tool_name, input_dict),
-                        timeout=timeout
-                    )
-                    return result
-                except asyncio.TimeoutError:
-                    raise RuntimeError(f"Tool call to '{tool_name}' timed out after {timeout}s")
-                except HeuristicViolation as e:
-                    raise RuntimeError(str(e))
-
         sandbox.mcp = SandboxMCP(dispatcher)
 
-        # Preload safe built-ins into the sandbox
-        import json, re
-        sandbox.__dict__["json"] = json
-        sandbox.__dict__["re"] = re
+        # Preload safe built-ins into the sandbox, only when the plan references them
+        if "json" in code:
+            sandbox.__dict__["json"] = json
+        if "re." in code:
+            sandbox.__dict__["re"] = re
 
         # Execute solve fn dynamically
-        exec(compile(code, "<solve_plan>", "exec"), sandbox.__dict__)
+        exec(_compile_plan(code), sandbox.__dict__)
 
         solve_fn = sandbox.__dict__.get("solve")
         if solve_fn is None:
@@ -103,7 +136,7 @@ async def run_python_sandbox(code: str, dispatcher: Any) -> str:
         elif isinstance(result, dict):
             return f"{json.dumps(result)}"
         elif isinstance(result, list):
-            return f"{' '.join(str(r) for r in result)}"
+            return ' '.join([str(r) for r in result])
         else:
             return f"{result}"
 
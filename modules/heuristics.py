@@ -8,12 +8,24 @@ Provides runtime validation and safety checks for the agent's operations
 import re
 import json
 import time
-from typing import Dict, Any, List, Optional, Tuple
+import math
+import hashlib
+import threading
+import itertools
+import ipaddress
+from functools import lru_cache
+from typing import AbstractSet, Dict, Any, Deque, List, Optional, Tuple
 from urllib.parse import urlparse
-from collections import defaultdict
-from pydantic import BaseModel
+from collections import defaultdict, deque, OrderedDict
+from pydantic import BaseModel, Field
 import asyncio
 
+# Optional fast JSON parser
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Optional logging fallback
 try:
     from agent import log
@@ -24,6 +36,176 @@ except ImportError:
         print(f"[{now}] [{stage}] {msg}")
 
 
+# ============================================
+# Precompiled Patterns
+# ============================================
+
+# Dangerous imports/operations in generated solve() plans
+# ([^\S\n]* is whitespace within a line: the patterns are run over joined lines and
+# must not match across line breaks)
+_DANGEROUS_PLAN_PATTERNS = [
+    (r'\bsubprocess\b', 'subprocess'),
+    (r'\bos\.system\b', 'os.system'),
+    (r'\beval[^\S\n]*\(', 'eval'),
+    (r'\bexec[^\S\n]*\(', 'exec'),
+    (r'\b__import__[^\S\n]*\(', '__import__'),
+    (r'\bopen[^\S\n]*\(', 'open'),  # Only match open() as function call
+    (r'\bfile[^\S\n]*\(', 'file'),
+    (r'\binput[^\S\n]*\(', 'input'),
+    (r'\braw_input[^\S\n]*\(', 'raw_input'),
+    (r'\bexecfile[^\S\n]*\(', 'execfile'),
+]
+# One alternation with a named group per pattern (operation names aren't valid group names)
+_PLAN_DANGER_RE = re.compile('|'.join(
+    f'(?P<p{i}>{pattern})' for i, (pattern, _) in enumerate(_DANGEROUS_PLAN_PATTERNS)
+))
+_PLAN_DANGER_NAMES = {f'p{i}': name for i, (_, name) in enumerate(_DANGEROUS_PLAN_PATTERNS)}
+
+# Lines that look like actual command execution (subprocess/os.system calls)
+_EXEC_KEYWORDS_RE = re.compile(r'subprocess\.|os\.system\(|os\.popen\(|exec\(|eval\(')
+
+# Suspicious Unicode (zero-width characters, bidi embeddings/overrides, BOM)
+_SUSPICIOUS_UNICODE_RE = re.compile(
+    '[\u200B'  # Zero-width space
+    '\u200C'  # Zero-width non-joiner
+    '\u200D'  # Zero-width joiner
+    '\u202A'  # Left-to-right embedding
+    '\u202B'  # Right-to-left embedding
+    '\u202C'  # Pop directional formatting
+    '\u202D'  # Left-to-right override
+    '\u202E'  # Right-to-left override
+    '\uFEFF]'  # Zero-width no-break space
+)
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7F]')
+
+# Suspicious shell command patterns
+# (matched against lowercased text, not IGNORECASE, to avoid Unicode case-folding matches)
+_DANGEROUS_CMD_PATTERNS = [re.compile(p) for p in (
+    r'rm\s+-[rf]{1,2}\s+/',  # rm -rf /
+    r'>\s*/dev/sd[a-z]',  # > /dev/sda
+    r'dd\s+if=.*of=/dev/',  # dd to device
+    r'mkfs\.',  # filesystem formatting
+    r':()\{.*\|.*&\};:',  # fork bomb
+)]
+
+# Common API key patterns
+_API_KEY_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'api[_-]?key["\']?\s*[:=]\s*["\']([a-zA-Z0-9_\-]{20,})',
+    r'secret[_-]?key["\']?\s*[:=]\s*["\']([a-zA-Z0-9_\-]{20,})',
+    r'password["\']?\s*[:=]\s*["\']([^"\']{8,})',
+    r'(sk|pk)_[a-z]{4,}_[a-zA-Z0-9]{20,}',  # Stripe-like keys
+    r'AIza[0-9A-Za-z\\-_]{35}',  # Google API keys
+)]
+
+# Cheap prefilter: every key pattern above needs a 20+ char token, except the password one
+# and the Google one (its class also admits '^', ']' and '\', which break up such a run)
+_HAS_LONG_TOKEN_RE = re.compile(r'[A-Za-z0-9_\-]{20,}|password|AIza', re.IGNORECASE)
+
+# Basic SQL injection patterns
+_SQLI_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r"'\s*OR\s+'1'\s*=\s*'1",
+    r";\s*DROP\s+TABLE",
+    r"UNION\s+SELECT",
+    r"--\s*$",
+    r"'\s*;",
+)]
+
+
+@lru_cache(maxsize=1024)
+def _cached_urlparse(url: str):
+    """urlparse, memoized: the same URL is validated and then rate-limited"""
+    return urlparse(url)
+
+
+# Exact types both serializers encode identically; anything else (UUID, Enum, datetime,
+# dataclasses, numpy, str/int subclasses...) is left to json.dumps to encode or reject
+_PLAIN_JSON_TYPES = frozenset((str, int, bool, type(None), dict, list, tuple))
+_ORJSON_MAX_DEPTH = 254  # orjson's recursion limit
+
+
+def _is_plain_json(obj: Any) -> bool:
+    """True if obj only holds plain JSON types and finite floats (orjson writes NaN/Infinity as null)"""
+    stack = [(obj, 0)]
+    while stack:
+        node, depth = stack.pop()
+        node_type = type(node)
+        if node_type is float:
+            if not math.isfinite(node):
+                return False
+        elif node_type not in _PLAIN_JSON_TYPES:
+            return False
+        elif depth > _ORJSON_MAX_DEPTH:
+            return False  # orjson would refuse it anyway; also stops on circular references
+        elif node_type is dict:
+            stack.extend((value, depth + 1) for value in node.values())
+        elif node_type is list or node_type is tuple:
+            stack.extend((item, depth + 1) for item in node)
+    return True
+
+
+def json_dumps(obj: Any, sort_keys: bool = False) -> str:
+    """
+    Serialize to JSON with the same output semantics as json.dumps (types accepted,
+    NaN/Infinity, \\uXXXX escaping), using orjson for plain data when available.
+    Only the separators differ: orjson output is compact.
+    """
+    if orjson is not None and _is_plain_json(obj):
+        try:
+            dumped = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None).decode()
+        except orjson.JSONEncodeError:
+            pass  # e.g. non-str keys, ints beyond 64 bits, deep nesting: the stdlib decides
+        else:
+            # The secret/injection regexes scan this text, so keep json.dumps' \uXXXX escaping
+            if dumped.isascii():
+                return dumped
+    return json.dumps(obj, sort_keys=sort_keys)
+
+
+def _json_loads(json_str: str) -> Any:
+    """Parse JSON with orjson when available, falling back to the stdlib"""
+    if orjson is not None:
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            pass  # stdlib also accepts NaN/Infinity, so let it decide
+    return json.loads(json_str)
+
+
+def _exceeds_depth(obj: Any, max_depth: int) -> bool:
+    """Iterative DFS that stops at the first node nested deeper than max_depth"""
+    stack = [(obj, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > max_depth:
+            return True
+        if isinstance(node, dict):
+            stack.extend((value, depth + 1) for value in node.values())
+        elif isinstance(node, list):
+            stack.extend((item, depth + 1) for item in node)
+    return False
+
+
+# Default blocklists (immutable, shared by every config instance)
+_BLOCKED_CMDS: Tuple[str, ...] = (
+    "rm -rf", "rm -fr", "rmdir /s", "del /f", "format",
+    "dd if=/dev/zero", ":(){:|:&};:", "mkfs", "sudo rm",
+    "> /dev/sda", "mv /* ", "chmod -R 777 /", "chown -R"
+)
+_BLOCKED_FILES: Tuple[str, ...] = (
+    "/etc/", "/sys/", "/proc/", "/dev/", "/boot/",
+    "C:\\Windows\\", "C:\\Program Files\\", "/var/", "/usr/bin/"
+)
+_BLOCKED_CMDS_LOWER = tuple(cmd.lower() for cmd in _BLOCKED_CMDS)
+_BLOCKED_FILES_LOWER = tuple(path.lower() for path in _BLOCKED_FILES)
+
+
+def _lowered(values: Tuple[str, ...], defaults: Tuple[str, ...], defaults_lower: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Lowercased copy of a blocklist, reusing the precomputed one for the defaults"""
+    if values == defaults:
+        return defaults_lower
+    return tuple(value.lower() for value in values)
+
+
 class HeuristicConfig(BaseModel):
     """Configuration for heuristic validators"""
     max_input_length: int = 50000  # 50k characters
@@ -33,15 +215,8 @@ class HeuristicConfig(BaseModel):
     url_call_window_seconds: int = 60
     request_timeout_seconds: int = 10
     allow_non_ascii: bool = True
-    blocked_commands: List[str] = [
-        "rm -rf", "rm -fr", "rmdir /s", "del /f", "format",
-        "dd if=/dev/zero", ":(){:|:&};:", "mkfs", "sudo rm",
-        "> /dev/sda", "mv /* ", "chmod -R 777 /", "chown -R"
-    ]
-    blocked_file_operations: List[str] = [
-        "/etc/", "/sys/", "/proc/", "/dev/", "/boot/",
-        "C:\\Windows\\", "C:\\Program Files\\", "/var/", "/usr/bin/"
-    ]
+    blocked_commands: Tuple[str, ...] = Field(default_factory=lambda: _BLOCKED_CMDS)
+    blocked_file_operations: Tuple[str, ...] = Field(default_factory=lambda: _BLOCKED_FILES)
     max_plan_length: int = 10000  # Max length of generated solve() code
 
 
@@ -54,15 +229,70 @@ class HeuristicViolation(Exception):
         super().__init__(f"[{severity.upper()}] {rule}: {message}")
 
 
+class _ResultCache:
+    """Small thread-safe LRU of validation results, keyed by a digest of the validated text"""
+    
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._results: "OrderedDict[bytes, Tuple[bool, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    
+    def get(self, key: bytes) -> Optional[Tuple[bool, Optional[str]]]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+    
+    def put(self, key: bytes, result: Tuple[bool, Optional[str]]):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+
 class HeuristicValidator:
     """Main validator class for agent safety checks"""
     
     def __init__(self, config: Optional[HeuristicConfig] = None):
         self.config = config or HeuristicConfig()
-        self.url_call_tracker: Dict[str, List[float]] = defaultdict(list)
+        
+        # Limits read on every validation, fetched once
+        self._max_input_length = self.config.max_input_length
+        self._max_json_depth = self.config.max_json_depth
+        self._max_files = self.config.max_files_per_call
+        self._max_url_calls = self.config.max_url_calls_per_domain
+        self._url_window = self.config.url_call_window_seconds
+        
+        self.url_call_tracker: Dict[str, Deque[float]] = defaultdict(deque)
         self.tool_call_tracker: Dict[str, int] = defaultdict(int)
         self.session_start_time = time.time()
         
+        # Plans are often retried verbatim, so remember results of the pure text checks
+        self._plan_cache = _ResultCache()
+        self._command_cache = _ResultCache()
+        
+        # Single alternation over all blocked commands (one pass instead of N substring scans).
+        # Matched against lowercased text without IGNORECASE: Unicode case folding would match
+        # text (e.g. U+017F for 's') whose .lower() is not one of the keys below.
+        blocked_cmds = self.config.blocked_commands
+        self._blocked_cmd_names = dict(zip(
+            _lowered(blocked_cmds, _BLOCKED_CMDS, _BLOCKED_CMDS_LOWER), blocked_cmds
+        ))
+        self._blocked_cmd_re = re.compile(
+            '|'.join(re.escape(cmd) for cmd in self._blocked_cmd_names)
+        ) if self._blocked_cmd_names else None
+        
+        blocked_files = self.config.blocked_file_operations
+        self._blocked_files = tuple(zip(
+            _lowered(blocked_files, _BLOCKED_FILES, _BLOCKED_FILES_LOWER), blocked_files
+        ))
+        
     # ============================================
     # 1. URL Validation
     # ============================================
@@ -77,7 +307,7 @@ class HeuristicValidator:
         
         # Basic URL format check
         try:
-            parsed = urlparse(url)
+            parsed = _cached_urlparse(url)
             if not parsed.scheme in ['http', 'https']:
                 return False, f"Invalid URL scheme: {parsed.scheme}. Only http/https allowed."
             if not parsed.netloc:
@@ -90,11 +320,14 @@ class HeuristicValidator:
         if parsed.hostname in blocked_hosts:
             return False, f"Access to {parsed.hostname} is blocked for security reasons"
         
-        # Check for private IP ranges
+        # Check for private/loopback/link-local/multicast IP literals (v4 and v6)
         if parsed.hostname:
-            if (parsed.hostname.startswith('192.168.') or 
-                parsed.hostname.startswith('10.') or
-                parsed.hostname.startswith('172.16.')):
+            try:
+                ip = ipaddress.ip_address(parsed.hostname)
+            except ValueError:
+                ip = None  # Regular domain name
+            if ip is not None and (ip.is_private or ip.is_loopback or
+                                   ip.is_link_local or ip.is_multicast or ip.is_unspecified):
                 return False, f"Access to private IP range is blocked"
         
         return True, None
@@ -108,30 +341,19 @@ class HeuristicValidator:
         Validate JSON structure and depth
         Returns: (is_valid, error_message, parsed_json)
         """
-        max_depth = max_depth or self.config.max_json_depth
+        max_depth = max_depth or self._max_json_depth
         
         if not json_str or not isinstance(json_str, str):
             return False, "JSON input is empty or not a string", None
         
         try:
-            parsed = json.loads(json_str)
+            parsed = _json_loads(json_str)
         except json.JSONDecodeError as e:
             return False, f"Invalid JSON: {str(e)}", None
         
-        # Check depth recursively
-        def get_depth(obj, current_depth=0):
-            if current_depth > max_depth:
-                return current_depth
-            if isinstance(obj, dict):
-                return max(get_depth(v, current_depth + 1) for v in obj.values()) if obj else current_depth
-            elif isinstance(obj, list):
-                return max(get_depth(item, current_depth + 1) for item in obj) if obj else current_depth
-            else:
-                return current_depth
-        
-        depth = get_depth(parsed)
-        if depth > max_depth:
-            return False, f"JSON depth ({depth}) exceeds maximum allowed ({max_depth})", parsed
+        # Check depth (stops at the first node past the limit)
+        if _exceeds_depth(parsed, max_depth):
+            return False, f"JSON depth exceeds maximum allowed ({max_depth})", parsed
         
         return True, None, parsed
     
@@ -145,8 +367,8 @@ class HeuristicValidator:
             return False, "Input is not a string"
         
         length = len(text)
-        if length > self.config.max_input_length:
-            return False, f"Input too long: {length} chars (max: {self.config.max_input_length})"
+        if length > self._max_input_length:
+            return False, f"Input too long: {length} chars (max: {self._max_input_length})"
         
         return True, None
     
@@ -164,28 +386,14 @@ class HeuristicValidator:
             return False, "Input is not a string"
         
         if strict:
-            try:
-                text.encode('ascii')
+            if text.isascii():
                 return True, None
-            except UnicodeEncodeError as e:
-                return False, f"Non-ASCII characters detected at position {e.start}"
+            return False, f"Non-ASCII characters detected at position {_NON_ASCII_RE.search(text).start()}"
         else:
             # Check for suspicious Unicode (like zero-width characters, right-to-left override, etc.)
-            suspicious_chars = [
-                '\u200B',  # Zero-width space
-                '\u200C',  # Zero-width non-joiner
-                '\u200D',  # Zero-width joiner
-                '\u202A',  # Left-to-right embedding
-                '\u202B',  # Right-to-left embedding
-                '\u202C',  # Pop directional formatting
-                '\u202D',  # Left-to-right override
-                '\u202E',  # Right-to-left override
-                '\uFEFF',  # Zero-width no-break space
-            ]
-            
-            for char in suspicious_chars:
-                if char in text:
-                    return False, f"Suspicious Unicode character detected: U+{ord(char):04X}"
+            match = _SUSPICIOUS_UNICODE_RE.search(text)
+            if match:
+                return False, f"Suspicious Unicode character detected: U+{ord(match.group()):04X}"
             
             return True, None
     
@@ -193,37 +401,37 @@ class HeuristicValidator:
     # 5. Rate Limiting / DDOS Prevention
     # ============================================
     
-    def check_url_rate_limit(self, url: str) -> Tuple[bool, Optional[str]]:
+    def check_url_rate_limit(self, url: str, domain: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
         Prevent DDOS by limiting calls to same domain
+        domain: netloc already parsed by the caller (parsed from url if omitted)
         Returns: (is_allowed, error_message)
         """
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc
-        except:
-            return False, "Cannot parse domain from URL"
+        if domain is None:
+            try:
+                domain = _cached_urlparse(url).netloc
+            except:
+                return False, "Cannot parse domain from URL"
         
         current_time = time.time()
-        window_start = current_time - self.config.url_call_window_seconds
+        window_start = current_time - self._url_window
         
-        # Clean old entries
-        self.url_call_tracker[domain] = [
-            t for t in self.url_call_tracker[domain] 
-            if t > window_start
-        ]
+        # Drop expired entries from the left (timestamps are appended in order)
+        calls = self.url_call_tracker[domain]
+        while calls and calls[0] <= window_start:
+            calls.popleft()
         
         # Check limit
-        call_count = len(self.url_call_tracker[domain])
-        if call_count >= self.config.max_url_calls_per_domain:
+        call_count = len(calls)
+        if call_count >= self._max_url_calls:
             return False, (
                 f"Rate limit exceeded for {domain}: "
-                f"{call_count} calls in {self.config.url_call_window_seconds}s "
-                f"(max: {self.config.max_url_calls_per_domain})"
+                f"{call_count} calls in {self._url_window}s "
+                f"(max: {self._max_url_calls})"
             )
         
         # Record this call
-        self.url_call_tracker[domain].append(current_time)
+        calls.append(current_time)
         return True, None
     
     # ============================================
@@ -262,16 +470,17 @@ class HeuristicValidator:
             file_paths = [file_paths]
         
         # Check count
-        if len(file_paths) > self.config.max_files_per_call:
+        if len(file_paths) > self._max_files:
             return False, (
                 f"Too many files: {len(file_paths)} "
-                f"(max: {self.config.max_files_per_call})"
+                f"(max: {self._max_files})"
             )
         
         # Check for dangerous paths
         for path in file_paths:
-            for blocked in self.config.blocked_file_operations:
-                if blocked.lower() in path.lower():
+            path_lower = path.lower()
+            for blocked_lower, blocked in self._blocked_files:
+                if blocked_lower in path_lower:
                     return False, f"Access to {blocked} is blocked for security"
         
         return True, None
@@ -288,20 +497,27 @@ class HeuristicValidator:
         if not isinstance(command, str):
             return False, "Command is not a string"
         
-        command_lower = command.lower()
+        # Fast exit: nothing in the text looks like command execution
+        if not _EXEC_KEYWORDS_RE.search(command):
+            return True, None
         
-        # Only check non-comment, non-string lines for actual command execution
-        # Skip lines that are comments or just variable assignments
-        lines = command.split('\n')
+        key = _ResultCache.key(command)
+        result = self._command_cache.get(key)
+        if result is None:
+            result = self._check_command_lines(command.split('\n'))
+            self._command_cache.put(key, result)
+        return result
+    
+    def _check_command_lines(self, lines: List[str]) -> Tuple[bool, Optional[str]]:
+        """Run the dangerous command checks over already-split lines"""
+        # Only check non-comment lines that look like actual subprocess/os.system calls
+        # (skips variable assignments, f-strings and comments)
         code_lines = []
         for line in lines:
             stripped = line.strip()
-            # Skip comments
             if stripped.startswith('#'):
                 continue
-            # Skip lines that are just variable assignments or f-strings
-            # Only check lines that look like actual subprocess/os.system calls
-            if any(keyword in stripped for keyword in ['subprocess.', 'os.system(', 'os.popen(', 'exec(', 'eval(']):
+            if _EXEC_KEYWORDS_RE.search(stripped):
                 code_lines.append(stripped)
         
         # Only check actual command execution lines
@@ -311,22 +527,18 @@ class HeuristicValidator:
             # No actual command execution detected
             return True, None
         
+        command_lower = command_code.lower()
+        
         # Check against blocked commands in actual execution lines
-        for blocked_cmd in self.config.blocked_commands:
-            if blocked_cmd.lower() in command_code.lower():
+        if self._blocked_cmd_re is not None:
+            match = self._blocked_cmd_re.search(command_lower)
+            if match:
+                blocked_cmd = self._blocked_cmd_names[match.group()]
                 return False, f"Dangerous command detected: '{blocked_cmd}'"
         
         # Check for suspicious patterns
-        dangerous_patterns = [
-            r'rm\s+-[rf]{1,2}\s+/',  # rm -rf /
-            r'>\s*/dev/sd[a-z]',  # > /dev/sda
-            r'dd\s+if=.*of=/dev/',  # dd to device
-            r'mkfs\.',  # filesystem formatting
-            r':()\{.*\|.*&\};:',  # fork bomb
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, command_code.lower()):
+        for pattern in _DANGEROUS_CMD_PATTERNS:
+            if pattern.search(command_lower):
                 return False, f"Dangerous command pattern detected"
         
         return True, None
@@ -335,15 +547,15 @@ class HeuristicValidator:
     # 9. Tool Registry Validation
     # ============================================
     
-    def validate_tool_exists(self, tool_name: str, available_tools: List[str]) -> Tuple[bool, Optional[str]]:
+    def validate_tool_exists(self, tool_name: str, available_tools: AbstractSet[str]) -> Tuple[bool, Optional[str]]:
         """
-        Verify tool exists in registry
+        Verify tool exists in registry (pass an ordered set, e.g. dict keys, for O(1) lookup)
         Returns: (exists, error_message)
         """
         if tool_name not in available_tools:
             return False, (
                 f"Tool '{tool_name}' not found in registry. "
-                f"Available tools: {', '.join(available_tools[:5])}..."
+                f"Available tools: {', '.join(itertools.islice(available_tools, 5))}..."
             )
         return True, None
     
@@ -361,33 +573,25 @@ class HeuristicValidator:
         if not valid:
             return False, f"Plan too long: {msg}"
         
-        # Check for dangerous imports/operations
-        dangerous_patterns = [
-            (r'\bsubprocess\b', 'subprocess'),
-            (r'\bos\.system\b', 'os.system'),
-            (r'\beval\s*\(', 'eval'),
-            (r'\bexec\s*\(', 'exec'),
-            (r'\b__import__\s*\(', '__import__'),
-            (r'\bopen\s*\(', 'open'),  # Only match open() as function call
-            (r'\bfile\s*\(', 'file'),
-            (r'\binput\s*\(', 'input'),
-            (r'\braw_input\s*\(', 'raw_input'),
-            (r'\bexecfile\s*\(', 'execfile'),
-        ]
-        
-        for pattern, name in dangerous_patterns:
-            # Check each line, skip comments
-            lines = plan_code.split('\n')
-            for line in lines:
-                stripped = line.strip()
-                if stripped.startswith('#'):
-                    continue
-                # Use regex to match actual function calls, not just the word
-                if re.search(pattern, line):
-                    return False, f"Dangerous operation '{name}' detected in plan"
+        key = _ResultCache.key(plan_code)
+        result = self._plan_cache.get(key)
+        if result is None:
+            result = self._scan_plan(plan_code)
+            self._plan_cache.put(key, result)
+        return result
+    
+    def _scan_plan(self, plan_code: str) -> Tuple[bool, Optional[str]]:
+        """Run the plan safety checks (uncached)"""
+        # Split once and drop comment lines once; every check below scans the same lines
+        code_lines = [line for line in plan_code.split('\n') if not line.lstrip().startswith('#')]
+        
+        # Check for dangerous imports/operations (regex matches actual calls, not just the word)
+        match = _PLAN_DANGER_RE.search('\n'.join(code_lines))
+        if match:
+            return False, f"Dangerous operation '{_PLAN_DANGER_NAMES[match.lastgroup]}' detected in plan"
         
         # Check for dangerous commands within the code
-        valid, msg = self.validate_command_safety(plan_code)
+        valid, msg = self._check_command_lines(code_lines)
         if not valid:
             return False, f"Dangerous command in plan: {msg}"
         
@@ -412,34 +616,20 @@ class HeuristicValidator:
     
     def validate_api_key_exposure(self, text: str) -> Tuple[bool, Optional[str]]:
         """Check for accidentally exposed API keys or secrets"""
-        # Common API key patterns
-        patterns = [
-            r'api[_-]?key["\']?\s*[:=]\s*["\']([a-zA-Z0-9_\-]{20,})',
-            r'secret[_-]?key["\']?\s*[:=]\s*["\']([a-zA-Z0-9_\-]{20,})',
-            r'password["\']?\s*[:=]\s*["\']([^"\']{8,})',
-            r'(sk|pk)_[a-z]{4,}_[a-zA-Z0-9]{20,}',  # Stripe-like keys
-            r'AIza[0-9A-Za-z\\-_]{35}',  # Google API keys
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
+        # Fast path: most tool args are short values with no token-like runs
+        if not _HAS_LONG_TOKEN_RE.search(text):
+            return True, None
+        
+        for pattern in _API_KEY_PATTERNS:
+            if pattern.search(text):
                 return False, "Potential API key or secret detected in input. Please use environment variables."
         
         return True, None
     
     def validate_sql_injection(self, query: str) -> Tuple[bool, Optional[str]]:
         """Basic SQL injection detection"""
-        suspicious_patterns = [
-            r"'\s*OR\s+'1'\s*=\s*'1",
-            r";\s*DROP\s+TABLE",
-            r"UNION\s+SELECT",
-            r"--\s*$",
-            r"'\s*;",
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
+        for pattern in _SQLI_PATTERNS:
+            if pattern.search(query):
                 return False, "Potential SQL injection pattern detected"
         
         return True, None
@@ -448,14 +638,62 @@ class HeuristicValidator:
     # Comprehensive Validation Pipeline
     # ============================================
     
+    def _check_args(self, tool_args: Dict[str, Any], args_str: Optional[str] = None) -> List[str]:
+        """Validate serialized tool arguments (JSON structure + API key exposure)"""
+        errors = []
+        try:
+            if args_str is None:
+                args_str = json_dumps(tool_args)
+            
+            # Validate JSON structure
+            valid, msg, _ = self.validate_json_input(args_str)
+            if not valid:
+                errors.append(f"Tool args validation: {msg}")
+            
+            # Check for API key exposure
+            valid, msg = self.validate_api_key_exposure(args_str)
+            if not valid:
+                errors.append(msg)
+            
+        except Exception as e:
+            errors.append(f"Error validating tool args: {str(e)}")
+        return errors
+    
+    def _check_url(self, url: str) -> List[str]:
+        """Validate URL, then apply the per-domain rate limit"""
+        valid, msg = self.validate_url(url)
+        if not valid:
+            return [f"URL validation: {msg}"]
+        
+        # validate_url succeeded, so this parse is a cache hit
+        domain = _cached_urlparse(url).netloc
+        valid, msg = self.check_url_rate_limit(url, domain)
+        if not valid:
+            return [f"Rate limit: {msg}"]
+        return []
+    
+    def _check_file(self, file_path: str) -> List[str]:
+        valid, msg = self.validate_file_inputs([file_path])
+        return [] if valid else [f"File validation: {msg}"]
+    
+    def _check_cmd(self, cmd: str) -> List[str]:
+        valid, msg = self.validate_command_safety(cmd)
+        return [] if valid else [f"Command safety: {msg}"]
+    
+    def _check_sql(self, query: str) -> List[str]:
+        valid, msg = self.validate_sql_injection(query)
+        return [] if valid else [f"SQL injection check: {msg}"]
+    
     async def validate_tool_call(
         self, 
         tool_name: str,
         tool_args: Dict[str, Any],
-        available_tools: List[str]
+        available_tools: AbstractSet[str],
+        args_str: Optional[str] = None
     ) -> Tuple[bool, List[str]]:
         """
         Run all relevant validations for a tool call
+        args_str: tool_args already serialized by the caller (serialized here if omitted)
         Returns: (is_valid, list_of_errors)
         """
         errors = []
@@ -465,66 +703,32 @@ class HeuristicValidator:
         if not valid:
             errors.append(msg)
         
+        input_dict = tool_args.get('input', {}) if isinstance(tool_args, dict) else {}
+        if not isinstance(input_dict, dict):
+            input_dict = {}
+        
         # 2. Check arguments
-        try:
-            args_str = json.dumps(tool_args)
-            
-            # Validate JSON structure
-            valid, msg, _ = self.validate_json_input(args_str)
-            if not valid:
-                errors.append(f"Tool args validation: {msg}")
-            
-            # Check for API key exposure
-            valid, msg = self.validate_api_key_exposure(args_str)
-            if not valid:
-                errors.append(msg)
-            
-        except Exception as e:
-            errors.append(f"Error validating tool args: {str(e)}")
+        errors.extend(self._check_args(tool_args, args_str))
         
         # 3. Tool-specific validations
-        if 'url' in tool_args or 'input' in tool_args:
-            input_dict = tool_args.get('input', {})
-            if isinstance(input_dict, dict) and 'url' in input_dict:
-                url = input_dict['url']
-                valid, msg = self.validate_url(url)
-                if not valid:
-                    errors.append(f"URL validation: {msg}")
-                else:
-                    # Check rate limit
-                    valid, msg = self.check_url_rate_limit(url)
-                    if not valid:
-                        errors.append(f"Rate limit: {msg}")
+        if ('url' in tool_args or 'input' in tool_args) and 'url' in input_dict:
+            errors.extend(self._check_url(input_dict['url']))
         
         # 4. File path validation
         if 'file_path' in tool_args or 'path' in tool_args:
-            input_dict = tool_args.get('input', {})
-            if isinstance(input_dict, dict):
-                file_path = input_dict.get('file_path') or input_dict.get('path')
-                if file_path:
-                    valid, msg = self.validate_file_inputs([file_path])
-                    if not valid:
-                        errors.append(f"File validation: {msg}")
+            file_path = input_dict.get('file_path') or input_dict.get('path')
+            if file_path:
+                errors.extend(self._check_file(file_path))
         
         # 5. Command validation
         if 'command' in tool_args or 'code' in tool_args:
-            input_dict = tool_args.get('input', {})
-            if isinstance(input_dict, dict):
-                cmd = input_dict.get('command') or input_dict.get('code', '')
-                if cmd:
-                    valid, msg = self.validate_command_safety(cmd)
-                    if not valid:
-                        errors.append(f"Command safety: {msg}")
+            cmd = input_dict.get('command') or input_dict.get('code', '')
+            if cmd:
+                errors.extend(self._check_cmd(cmd))
         
         # 6. Query validation (SQL injection)
-        if 'query' in tool_args:
-            input_dict = tool_args.get('input', {})
-            if isinstance(input_dict, dict) and 'query' in input_dict:
-                query = input_dict['query']
-                if isinstance(query, str):
-                    valid, msg = self.validate_sql_injection(query)
-                    if not valid:
-                        errors.append(f"SQL injection check: {msg}")
+        if 'query' in tool_args and isinstance(input_dict.get('query'), str):
+            errors.extend(self._check_sql(input_dict['query']))
         
         return len(errors) == 0, errors
     
@@ -0,0 +1,23 @@
+# tests/test_action.py
+
+import asyncio
+
+import pytest
+
+from modules.action import SandboxMCP
+
+
+class FakeDispatcher:
+    async def list_all_tools(self):
+        return ["t"]
+
+    async def call_tool(self, tool_name, input_dict):
+        return "ok"
+
+
+def test_deeply_nested_args_fail_validation():
+    deep = cur = {}
+    for _ in range(5000):
+        cur["a"] = cur = {}
+    with pytest.raises(RuntimeError, match="Tool call validation failed"):
+        asyncio.run(SandboxMCP(FakeDispatcher()).call_tool("t", {"input": deep}))
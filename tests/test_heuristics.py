@@ -0,0 +1,128 @@
+# tests/test_heuristics.py
+
+import asyncio
+import dataclasses
+import datetime
+import enum
+import json
+import uuid
+
+import pytest
+
+from modules.heuristics import HeuristicValidator, json_dumps
+
+
+def test_command_safety_blocks_configured_commands():
+    validator = HeuristicValidator()
+    assert validator.validate_command_safety("os.system('SUDO RM foo')") == (
+        False, "Dangerous command detected: 'sudo rm'"
+    )
+
+
+def test_command_safety_ignores_unicode_case_folds():
+    # 'ſ' (U+017F) case-folds to 's' but does not lowercase to it
+    validator = HeuristicValidator()
+    for text in ("subprocess.call('ſudo rm foo')", "os.popen('mkfſ')", "os.system('rmdir /ſ')",
+                 "eval(mkfſ."):
+        assert validator.validate_command_safety(text) == (True, None)
+
+
+def test_command_patterns_match_case_insensitively():
+    validator = HeuristicValidator()
+    assert validator.validate_command_safety("os.system('MKFS.ext4 x')") == (
+        False, "Dangerous command detected: 'mkfs'"
+    )
+    assert validator.validate_command_safety("os.system('DD IF=x OF=/dev/sdb')") == (
+        False, "Dangerous command pattern detected"
+    )
+
+
+def test_generated_plan_with_unicode_case_fold_does_not_raise():
+    validator = HeuristicValidator()
+    plan = "async def solve():\n    r = os.popen('ſudo rm x')\n    return r"
+    assert validator.validate_generated_plan(plan) == (True, None)
+
+
+def test_tool_call_with_non_dict_args_does_not_raise():
+    validator = HeuristicValidator()
+    result = asyncio.run(validator.validate_tool_call("t", "some string", ["t"]))
+    assert result == (True, [])
+
+
+def test_api_key_prefilter_keeps_google_keys_with_punctuation():
+    validator = HeuristicValidator()
+    key = 'AIza' + ('A' * 10 + '^') * 3 + 'AA'
+    assert validator.validate_api_key_exposure(key)[0] is False
+    assert validator.validate_api_key_exposure('{"q": "hello"}') == (True, None)
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+def test_json_dumps_rejects_what_the_stdlib_rejects():
+    @dataclasses.dataclass
+    class Point:
+        x: int
+
+    for value in (datetime.datetime(2024, 1, 1), Point(1), uuid.uuid4(), Color.RED, object()):
+        with pytest.raises(TypeError):
+            json_dumps({"value": value})
+
+
+def test_json_dumps_escapes_non_ascii_like_the_stdlib():
+    assert json_dumps({"password": "päss"}) == json.dumps({"password": "päss"})
+    assert list(json.loads(json_dumps({"b": 1, "a": 2}, sort_keys=True))) == ["a", "b"]
+
+
+def test_tool_call_flags_non_ascii_password():
+    validator = HeuristicValidator()
+    is_valid, errors = asyncio.run(
+        validator.validate_tool_call("t", {"input": {"password": "päss"}}, ["t"])
+    )
+    assert not is_valid and "API key or secret" in errors[0]
+
+
+def test_missing_tool_lists_tools_in_registry_order():
+    validator = HeuristicValidator()
+    tools = dict.fromkeys(["t1", "t2", "t3", "t4", "t5", "t6"]).keys()
+    assert validator.validate_tool_exists("nope", tools) == (
+        False, "Tool 'nope' not found in registry. Available tools: t1, t2, t3, t4, t5..."
+    )
+
+
+def test_plan_scan_does_not_match_across_lines():
+    validator = HeuristicValidator()
+    for body in ("x = eval\n(1)", "x = open\n  # c\n(1)"):
+        assert validator.validate_generated_plan(body) == (True, None)
+    assert validator.validate_generated_plan("x = eval \t(1)") == (
+        False, "Dangerous operation 'eval' detected in plan"
+    )
+
+
+def test_json_dumps_keeps_nan_and_infinity():
+    value = {"a": float("nan"), "b": float("inf")}
+    assert json_dumps(value) == json.dumps(value)
+
+
+@pytest.mark.parametrize("url", [
+    "http://172.17.0.1/",
+    "http://172.31.255.255/",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[fd00::1]/",
+    "http://[::ffff:127.0.0.1]/",
+    "http://10.0.0.1/",
+])
+def test_validate_url_blocks_private_addresses(url):
+    validator = HeuristicValidator()
+    assert validator.validate_url(url) == (False, "Access to private IP range is blocked")
+
+
+@pytest.mark.parametrize("url", [
+    "http://10.example.com/",
+    "http://172.32.0.1/",
+    "https://8.8.8.8/",
+])
+def test_validate_url_allows_public_hosts(url):
+    validator = HeuristicValidator()
+    assert validator.validate_url(url) == (True, None)